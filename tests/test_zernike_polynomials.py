@@ -0,0 +1,171 @@
+import math
+
+import numpy as np
+import pytest
+
+from zernikepy import clear_mesh_cache, create_mesh, zernike_nl, zernike_nl_into, zernike_polynomials
+
+
+def _osa_pairs(order_max):
+    """(n, l) pairs of the OSA indices 0, ..., order_max, enumerated by increasing n then l"""
+    pairs = []
+    n = 0
+    while len(pairs) <= order_max:
+        pairs.extend((n, l) for l in range(-n, n + 1, 2))
+        n += 1
+    return pairs[:order_max + 1]
+
+
+def _reference(j, size):
+    """Zernike polynomial of OSA index j from the explicit binomial sum on the full mesh
+
+    np.linspace is not exactly antisymmetric, the negative coordinates are set to the mirror of the positive ones
+    as zernike_polynomials does, otherwise pixels on the rim may fall on the other side of it.
+    """
+    n, l = _osa_pairs(j)[j]
+    m = abs(l)
+    radius = size / 2
+    x = np.linspace(-radius, radius, size)
+    x[:size // 2] = -x[::-1][:size // 2]
+    xx, yy = np.meshgrid(x, x, indexing='xy')
+    rho = np.sqrt(xx ** 2 + yy ** 2)
+    phi = np.arctan2(yy, xx)
+    R = sum((-1) ** k * math.comb(n - k, k) * math.comb(n - 2 * k, (n - m) // 2 - k) * (rho / radius) ** (n - 2 * k)
+            for k in range((n - m) // 2 + 1))
+    Z = np.where(rho <= radius, R, 0)
+    return Z * (np.cos(m * phi) if l >= 0 else np.sin(m * phi))
+
+
+@pytest.mark.parametrize('size', [0, 1, 2, 3, 8, 17])
+@pytest.mark.parametrize('mode', [0, 1, 2, 4, 5, 7, 12, 24])
+def test_single_mode(mode, size):
+    Z = zernike_polynomials(mode=mode, size=size)
+    assert Z.shape == (size, size)
+    np.testing.assert_allclose(Z, _reference(mode, size), atol=1e-12)
+
+
+@pytest.mark.parametrize('size', [0, 1, 2, 3, 32, 33])
+def test_all_modes(size):
+    # OSA index 90 has n = 12
+    Z = zernike_polynomials(mode=90, select='all', size=size)
+    assert Z.shape == (91, size, size)
+    for j in range(91):
+        np.testing.assert_allclose(Z[j], _reference(j, size), atol=1e-11)
+
+
+def test_all_modes_high_order():
+    # OSA index 230 has n = 20, the explicit binomial sum loses a few digits to cancellation at this order
+    Z = zernike_polynomials(mode=230, select='all', size=33)
+    for j in range(231):
+        np.testing.assert_allclose(Z[j], _reference(j, 33), atol=1e-8)
+
+
+@pytest.mark.parametrize('size', [300, 301])
+@pytest.mark.parametrize('mode', [0, 3, 8, 13])
+def test_single_mode_large_size(mode, size):
+    # large enough for the compiled kernel when numba is installed
+    Z = zernike_polynomials(mode=mode, size=size)
+    np.testing.assert_allclose(Z, _reference(mode, size), atol=1e-10)
+
+
+@pytest.mark.parametrize('size', [2, 3, 101, 128, 301])
+@pytest.mark.parametrize('select', [None, 'all'])
+def test_mirror_symmetry(select, size):
+    # the image is exactly symmetric or antisymmetric under x -> -x and y -> -y, including the pixels on the rim
+    # (the central row and column of odd sizes are left out, they are their own mirror)
+    h = size // 2
+    Z = zernike_polynomials(mode=14, select=select, size=size)
+    modes = [14] if select is None else range(15)
+    for j, (n, l) in zip(modes, [_osa_pairs(j)[j] for j in modes]):
+        Zj = Z if select is None else Z[j]
+        parity = (-1) ** abs(l)
+        sign_x, sign_y = (parity, 1) if l >= 0 else (-parity, -1)
+        assert np.array_equal(Zj[:, :h], sign_x * Zj[:, ::-1][:, :h])
+        assert np.array_equal(Zj[:h, :], sign_y * Zj[::-1, :][:h, :])
+
+
+def test_selected_modes_are_sorted():
+    Z = zernike_polynomials(mode=10, select=[4, 'vertical coma', 'oblique astigmatism'], size=16)
+    for i, j in enumerate([3, 4, 7]):
+        np.testing.assert_allclose(Z[i], _reference(j, 16), atol=1e-12)
+
+
+@pytest.mark.parametrize('mode', [35, 36, 44, 54, 65])
+def test_high_single_mode(mode):
+    np.testing.assert_allclose(zernike_polynomials(mode=mode, size=17), _reference(mode, 17), atol=1e-12)
+
+
+@pytest.mark.parametrize('select', [None, 'all'])
+def test_float32(select):
+    Z = zernike_polynomials(mode=14, select=select, size=33, dtype=np.float32)
+    assert Z.dtype == np.float32
+    ref = _reference(14, 33) if select is None else np.stack([_reference(j, 33) for j in range(15)])
+    np.testing.assert_allclose(Z, ref, atol=1e-5)
+
+
+@pytest.mark.parametrize('select', [None, 'all'])
+def test_longdouble(select):
+    # large enough for the compiled kernel, which does not support this type
+    Z = zernike_polynomials(mode=7, select=select, size=256, dtype=np.longdouble)
+    assert Z.dtype == np.longdouble
+    ref = _reference(7, 256) if select is None else np.stack([_reference(j, 256) for j in range(8)])
+    np.testing.assert_allclose(Z.astype(np.float64), ref, atol=1e-10)
+
+
+@pytest.mark.parametrize('select', [None, 'all'])
+def test_float16(select):
+    # large enough for the compiled kernel, which does not support this type
+    Z = zernike_polynomials(mode=7, select=select, size=256, dtype=np.float16)
+    assert Z.dtype == np.float16
+    ref = _reference(7, 256) if select is None else np.stack([_reference(j, 256) for j in range(8)])
+    # half precision rounds the radius of pixels next to the rim to 1, putting them on either side of it
+    x = np.linspace(-1, 1, 256)
+    inside = np.hypot(*np.meshgrid(x, x)) < 1 - 2 ** -8
+    if select is not None:
+        inside = inside[None]
+    np.testing.assert_allclose(np.where(inside, Z, 0), np.where(inside, ref, 0), atol=1e-2)
+
+
+def test_invalid_dtype():
+    with pytest.raises(TypeError):
+        zernike_polynomials(mode=4, size=16, dtype=int)
+
+
+def test_zernike_nl_integer_rho():
+    Z = zernike_nl(2, 0, np.arange(4).reshape(2, 2), np.zeros((2, 2)), 3.0)
+    np.testing.assert_allclose(Z, 2 * (np.arange(4).reshape(2, 2) / 3) ** 2 - 1)
+
+
+def test_zernike_nl_into():
+    rho, phi = create_mesh(16, 8.0)
+    out = np.empty((16, 16))
+    assert zernike_nl_into(4, -2, rho, phi, 8.0, out) is out
+    np.testing.assert_allclose(out, zernike_nl(4, -2, rho, phi, 8.0))
+
+
+def test_numpy_integer_inputs():
+    Z = zernike_polynomials(mode=np.int64(5), size=np.int32(17))
+    np.testing.assert_array_equal(Z, zernike_polynomials(mode=5, size=17))
+
+
+@pytest.mark.parametrize('kwargs', [{'mode': True}, {'size': True}, {'mode': 2.0}])
+def test_invalid_integer_inputs(kwargs):
+    with pytest.raises(TypeError):
+        zernike_polynomials(**kwargs)
+
+
+def test_create_mesh_is_cached_and_read_only():
+    rho, phi = create_mesh(8, 4.0)
+    assert create_mesh(8, 4.0)[0] is rho
+    with pytest.raises(ValueError):
+        rho[0, 0] = 0
+    with pytest.raises(ValueError):
+        phi[0, 0] = 0
+
+
+def test_clear_mesh_cache():
+    rho, _ = create_mesh(8, 4.0)
+    clear_mesh_cache()
+    rho_new, _ = create_mesh(8, 4.0)
+    assert rho_new is not rho
+    np.testing.assert_array_equal(rho_new, rho)
@@ -1 +1 @@
-from .zernike_polynomials import zernike_polynomials, zernike_nl, create_mesh
+from .zernike_polynomials import zernike_polynomials, zernike_nl, zernike_nl_into, create_mesh, clear_mesh_cache
@@ -0,0 +1,80 @@
+"""Optional compiled kernels, used when numba is available
+
+The kernels are compiled just in time rather than shipped as a C extension, so that the package stays pure Python
+and installs without a compiler. Without numba, the NumPy implementation is used.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+
+@lru_cache(maxsize=None)
+def _get_kernel():
+    """compile the fused kernel on first use
+
+    numba is imported here rather than at module level, since importing it is slow and the kernel is only needed
+    for single polynomials on large meshes.
+
+    Returns
+    -------
+    kernel: callable or None
+        the compiled kernel, None if numba is not installed
+    """
+    try:
+        from numba import njit, prange
+    except ImportError:
+        return None
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _zernike_nl_kernel(coeffs: np.ndarray, m: int, is_cos: bool, rho: np.ndarray, phi: np.ndarray,
+                           radius: float, out: np.ndarray):
+        """ Fused computation of a Zernike polynomial, written into out in a single pass
+
+        Parameters
+        ----------
+        coeffs: np.ndarray
+            coefficients of the radial polynomial in rho^2, from the highest power to the constant term
+        m: int
+            index m in the definition on wikipedia, nonnegative integer
+        is_cos: bool
+            angular part is cos(m * phi) if True, sin(m * phi) otherwise
+        rho: np.ndarray
+            radial distance, 2D
+        phi: np.ndarray
+            azimuthal angle, 2D
+        radius: float
+            radius of the disk on which the Zernike polynomial is defined
+        out: np.ndarray
+            output array with the same shape as rho
+
+        Returns
+        -------
+
+        """
+        h, w = rho.shape
+        for i in prange(h):
+            for j in range(w):
+                if rho[i, j] > radius:
+                    out[i, j] = 0.0
+                    continue
+                r = rho[i, j] / radius
+                u = r * r
+                R = coeffs[0]
+                for c in coeffs[1:]:
+                    R = R * u + c
+                # r^m by repeated squaring
+                r_m = 1.0
+                base = r
+                e = m
+                while e:
+                    if e & 1:
+                        r_m *= base
+                    base *= base
+                    e >>= 1
+                if m == 0:
+                    out[i, j] = R
+                    continue
+                angle = m * phi[i, j]
+                out[i, j] = R * r_m * (np.cos(angle) if is_cos else np.sin(angle))
+
+    return _zernike_nl_kernel
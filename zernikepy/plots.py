@@ -2,7 +2,7 @@ import typing as tp
 
 import numpy as np
 import matplotlib.pyplot as plt
-import matplotlib.patches as patches
+from matplotlib.path import Path
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 
 _FONTSIZE = 15
@@ -59,7 +59,7 @@ def visualize_all(imgs: np.ndarray, orders: tp.List, ncols: int, **kwargs):
     Parameters
     ----------
     imgs: np.ndarray
-        all the images in the list of orders
+        all the images in the list of orders, stacked in the first dimension
     orders: list
         list of all the modes
     ncols: int
@@ -73,24 +73,25 @@ def visualize_all(imgs: np.ndarray, orders: tp.List, ncols: int, **kwargs):
     """
     cmap = kwargs.get('cmap')
     order_max = orders[-1]
-    fig, axes = plt.subplots(ncols, ncols, figsize=(_FIGSIZE*1.5, _FIGSIZE*1))
+    fig, axes = plt.subplots(ncols, ncols, figsize=(_FIGSIZE*1.5, _FIGSIZE*1), squeeze=False)
+    # only show the disk on which the polynomial is defined, the same path clips all the images
+    h, w = imgs.shape[1:]
+    clip_path = Path.circle((h//2, w//2), radius=h/2-1)
+    # dymanic fontsize for the title
+    title_fontsize = int(_FONTSIZE*4/ncols)
     idx = 0
     order_idx = 0
-    for r, row in enumerate(axes):
-        for c, ax in enumerate(row):
-            ax.set_axis_off()
-            if c > r:
-                continue
-            if order_idx in orders:
-                img = imgs[:, :, idx]
-                im = ax.imshow(img, cmap=cmap)
-                # dymanic fontsize for the title, adjust title position
-                ax.set_title(f'{order_idx}', fontsize=int(_FONTSIZE*4/ncols), y=1.01, pad=0)
-                # only show the disk on which the polynomial is defined
-                h, w = img.shape
-                patch = patches.Circle((h//2, w//2), radius=h/2-1, transform=ax.transData)
-                im.set_clip_path(patch)
-                idx += 1
-            order_idx += 1
+    for i, ax in enumerate(axes.ravel()):
+        ax.set_axis_off()
+        r, c = divmod(i, ncols)
+        if c > r:
+            continue
+        if order_idx in orders:
+            im = ax.imshow(imgs[idx], cmap=cmap)
+            # adjust title position
+            ax.set_title(f'{order_idx}', fontsize=title_fontsize, y=1.01, pad=0)
+            im.set_clip_path(clip_path, transform=ax.transData)
+            idx += 1
+        order_idx += 1
     fig.suptitle(f'Zernike modes up to order {order_max}', fontsize=_FONTSIZE)
     plt.show()
@@ -1,11 +1,15 @@
+import math
 import typing as tp
+from functools import lru_cache
 
 import numpy as np
-from scipy.special import binom
-from zernikepy.plots import visualize_all, visualize_one
+from zernikepy._kernels import _get_kernel
 
 ModeType = tp.Union[int, str]
 
+# accepted integer types, including numpy scalars
+_INT_TYPES = (int, np.integer)
+
 lookup_table = {
     'piston': 0,
     'vertical tilt': 1,
@@ -24,11 +28,17 @@ lookup_table = {
     'vertical quadrafoil': 14
 }
 
+# images with at least this many pixels per side are computed with the compiled kernel, if numba is installed
+_KERNEL_MIN_SIZE = 256
+# floating point types the kernel can be compiled for, others use the NumPy implementation
+_KERNEL_DTYPES = (np.float32, np.float64)
+
 
 def zernike_polynomials(mode: tp.Union[int, str] = 'defocus',
                         select: tp.Union[int, str, tp.List[ModeType]] = None,
                         size: int = 128,
                         show: bool = False,
+                        dtype: tp.Optional[np.dtype] = None,
                         **kwargs) -> np.ndarray:
     """ Computation of Zernike polynomials of (or up to) a given order
 
@@ -48,6 +58,9 @@ def zernike_polynomials(mode: tp.Union[int, str] = 'defocus',
     show: bool
         default: False
         plot the images or not
+    dtype: np.dtype
+        default: None
+        floating point type of the output; if None, float32 when show is True (enough for display), float64 otherwise
     Returns
     -------
 
@@ -56,43 +69,60 @@ def zernike_polynomials(mode: tp.Union[int, str] = 'defocus',
     Ref. https://en.wikipedia.org/wiki/Zernike_polynomials#Zernike_polynomials
     """
     # validate input variables
-    orders = _validate_inputs(mode, select, size)
-    order_max = orders[-1]
-    # create mesh
-    radius = size / 2
-    rho, phi = create_mesh(size, radius)
-    # find (n, l) pairs such that n(n+2)+l/2 in orders
-    n = 0
+    orders = _validate_inputs(mode, select, size, dtype)
+    if dtype is None:
+        dtype = np.float32 if show else np.float64
+    # find (n, l) pairs such that (n(n+2)+l)/2 in orders, by inverting the OSA index
     pairs = []
-    break_loop = False
-    while not break_loop:
-        for l in range(-n, n + 1, 2):
-            j = (n * (n + 2) + l) / 2
-            if j in orders:
-                pairs.append((n, l))
-            if j > order_max:
-                break_loop = True
-        n += 1
-
-    # compute the polynomial(s)
+    for j in orders:
+        n = int(math.ceil((-3 + math.sqrt(9 + 8 * j)) / 2))
+        l = 2 * j - n * (n + 2)
+        pairs.append((n, l))
     n_pairs  = len(pairs)
     if n_pairs == 0:
         raise ValueError(f'No Zernike polynomial of mode(s): {orders} found')
-    elif n_pairs == 1:
+
+    # create mesh
+    radius = size / 2
+    # only the quadrant x >= 0, y >= 0 is computed, the rest follows from the symmetries of the polynomials;
+    # a single polynomial needs phi, several ones only cos(phi) and sin(phi)
+    if n_pairs == 1:
+        rho, phi = _create_mesh(size, radius, True, np.dtype(dtype))
+    else:
+        rho, cos_phi, sin_phi = _create_direction_mesh(size, radius, True, np.dtype(dtype))
+    # normalized squared radial distance, shared by all the polynomials
+    u = rho * rho
+    u /= radius ** 2
+    # pixels outside the disk, where all the polynomials vanish
+    outside = rho > radius
+
+    # compute the polynomial(s) on the quadrant, directly in the output array
+    s0 = size // 2
+    if n_pairs == 1:
         n, l = pairs[0]
-        output = zernike_nl(n, l, rho, phi, radius)
+        output = np.empty((size, size), dtype=dtype)
+        zernike_nl_into(n, l, rho, phi, radius, output[s0:, s0:], u, outside, use_kernel=size >= _KERNEL_MIN_SIZE)
+        _reflect_quadrant(l, output)
         if show:
+            # imported here so that matplotlib is only loaded when plotting
+            from zernikepy.plots import visualize_one
             visualize_one(output, orders[0], **kwargs)
     else:
-        output = np.dstack([zernike_nl(n, l, rho, phi, radius) for (n, l) in pairs])
+        # one contiguous image per mode
+        output = np.empty((n_pairs, size, size), dtype=dtype)
+        _zernike_batch(pairs, rho, cos_phi, sin_phi, radius, u, outside, output[:, s0:, s0:])
+        for i, (n, l) in enumerate(pairs):
+            _reflect_quadrant(l, output[i])
         if show:
             _n, _ = pairs[-1]
+            from zernikepy.plots import visualize_all
             visualize_all(output, orders, _n + 1, **kwargs)
 
     return output
 
 
-def zernike_nl(n: int, l: int, rho: float, phi: float, radius: float):
+def zernike_nl(n: int, l: int, rho: float, phi: float, radius: float, u: tp.Optional[np.ndarray] = None,
+               outside: tp.Optional[np.ndarray] = None, use_kernel: bool = False):
     """ Computation of the Zernike polynomial of order n and m in the polar coordinates
 
     Parameters
@@ -107,26 +137,235 @@ def zernike_nl(n: int, l: int, rho: float, phi: float, radius: float):
         azimuthal angle
     radius: float
         radius of the disk on which the Zernike polynomial is defined
+    u: np.ndarray
+        default: None
+        precomputed (rho / radius)^2, computed from rho if None
+    outside: np.ndarray
+        default: None
+        precomputed mask rho > radius, computed from rho if None
+    use_kernel: bool
+        default: False
+        compute the polynomial with the compiled kernel if numba is installed and rho is float32 or float64,
+        worth it on large 2D meshes only
 
     Returns
     -------
     Z: np.ndarray
         Zernike polynomial given indices n and l
     """
+    return zernike_nl_into(n, l, rho, phi, radius, np.empty(np.shape(rho), dtype=np.result_type(rho, 1.0)), u,
+                           outside, use_kernel)
+
+
+def zernike_nl_into(n: int, l: int, rho: np.ndarray, phi: np.ndarray, radius: float, out: np.ndarray,
+                    u: tp.Optional[np.ndarray] = None, outside: tp.Optional[np.ndarray] = None,
+                    use_kernel: bool = False) -> np.ndarray:
+    """ Computation of the Zernike polynomial of order n and m in the polar coordinates, written into a given array
+
+    Parameters
+    ----------
+    n: int
+        index n in the definition on wikipedia, positive integer
+    l: int
+        |l| = m, m is the index m in the definition on wikipedia. l can be positive or negative
+    rho: np.ndarray
+        radial distance
+    phi: np.ndarray
+        azimuthal angle
+    radius: float
+        radius of the disk on which the Zernike polynomial is defined
+    out: np.ndarray
+        array with the same shape as rho in which the polynomial is written
+    u: np.ndarray
+        default: None
+        precomputed (rho / radius)^2, computed from rho if None
+    outside: np.ndarray
+        default: None
+        precomputed mask rho > radius, computed from rho if None
+    use_kernel: bool
+        default: False
+        compute the polynomial with the compiled kernel if numba is installed and rho and out are float32 or
+        float64, worth it on large 2D meshes only
+
+    Returns
+    -------
+    out: np.ndarray
+        Zernike polynomial given indices n and l
+    """
+    # plain Python integers, so that no numpy scalar enters the coefficients and exponents
+    n, l = int(n), int(l)
     m = abs(l)
-    R = 0
-    for k in np.arange(0, (n - m) / 2 + 1):
-        R = R + (-1) ** k * binom(n - k, k) * binom(n - 2 * k, (n - m) / 2 - k) * (rho / radius) ** (n - 2 * k)
+    # R is rho^m times a polynomial in u = rho^2, coefficients ordered from the highest power of u (k = 0)
+    coeffs = _radial_coefficients(n, m)
+    if use_kernel and out.dtype in _KERNEL_DTYPES and np.result_type(rho) in _KERNEL_DTYPES:
+        kernel = _get_kernel()
+        if kernel is not None:
+            kernel(np.array(coeffs, dtype=out.dtype), m, l >= 0, rho, phi, radius, out)
+            return out
+    if u is None:
+        u = (rho * rho) / (radius * radius)
+    # Horner's rule, in place
+    out[...] = coeffs[0]
+    for c in coeffs[1:]:
+        out *= u
+        out += c
+    if m:
+        out *= (rho / radius) ** m
+
+    # radial part
+    out[rho > radius if outside is None else outside] = 0
+
+    # angular part, constant for rotationally symmetric modes (e.g. piston, defocus)
+    if m:
+        out *= np.cos(m * phi) if l >= 0 else np.sin(m * phi)
+    return out
+
+
+def _zernike_batch(pairs: tp.List[tp.Tuple[int, int]], rho: np.ndarray, cos_phi: np.ndarray, sin_phi: np.ndarray,
+                   radius: float, u: np.ndarray, outside: np.ndarray, out: np.ndarray):
+    """ Computation of several Zernike polynomials at once
+
+    The radial polynomials sharing the same m are obtained one after another with Kintner's recurrence
+    K1 R_n^m = (K2 rho^2 + K3) R_{n-2}^m + K4 R_{n-4}^m, starting from R_m^m = rho^m and
+    R_{m+2}^m = (m+2) rho^{m+2} - (m+1) rho^m, which avoids the cancellation of the explicit sum at high orders.
+    Evaluating all the radial polynomials as one product of their coefficient matrix with the powers of rho was
+    measured to be no faster, and suffers from that cancellation.
+
+    Parameters
+    ----------
+    pairs: list
+        list of (n, l) pairs of the polynomials
+    rho: np.ndarray
+        radial distance
+    cos_phi, sin_phi: np.ndarray
+        cosine and sine of the azimuthal angle
+    radius: float
+        radius of the disk on which the Zernike polynomials are defined
+    u: np.ndarray
+        (rho / radius)^2
+    outside: np.ndarray
+        mask rho > radius
+    out: np.ndarray
+        array in which the Zernike polynomials are stacked in the first dimension, in the same order as pairs
+
+    Returns
+    -------
+
+    """
+    # indices of the pairs for each m and each n
+    groups = {}
+    for i, (n, l) in enumerate(pairs):
+        groups.setdefault(abs(l), {}).setdefault(n, []).append(i)
 
     # radial part
-    Z = np.where(rho <= radius, R, 0)
+    tmp = np.empty_like(u)
+    for m, indices in groups.items():
+        n_top = max(indices)
+        # R_{n-4}^m and R_{n-2}^m of the recurrence
+        prev2 = np.power(rho / radius, m)
+        prev1 = (m + 2) * u - (m + 1)
+        prev1 *= prev2
+        for i in indices.get(m, []):
+            out[i] = prev2
+        for i in indices.get(m + 2, []):
+            out[i] = prev1
+        for n in range(m + 4, n_top + 1, 2):
+            k1 = (n + m) * (n - m) * (n - 2) / 2
+            k2 = 2 * n * (n - 1) * (n - 2)
+            k3 = -m * m * (n - 1) - n * (n - 1) * (n - 2)
+            k4 = -n * (n + m - 2) * (n - m - 2) / 2
+            np.multiply(u, k2 / k1, out=tmp)
+            tmp += k3 / k1
+            tmp *= prev1
+            prev2 *= k4 / k1
+            prev2 += tmp
+            prev2, prev1 = prev1, prev2
+            for i in indices.get(n, []):
+                out[i] = prev1
+    out[:, outside] = 0
 
     # angular part
-    Z *= np.cos(m * phi) if l >= 0 else np.sin(m * phi)
-    return Z
+    cos_m, sin_m = _harmonics(cos_phi, sin_phi, max(abs(l) for _, l in pairs))
+    for i, (n, l) in enumerate(pairs):
+        if l:
+            out[i] *= cos_m[l] if l > 0 else sin_m[-l]
 
 
-def create_mesh(size: int, radius: float):
+def _harmonics(cos_phi: np.ndarray, sin_phi: np.ndarray,
+               m_max: int) -> tp.Tuple[tp.List[np.ndarray], tp.List[np.ndarray]]:
+    """ cos(m * phi) and sin(m * phi) for m = 0, ..., m_max
+
+    No trigonometric function is evaluated: by de Moivre's formula cos(m * phi) + i sin(m * phi) = (x + iy)^m / rho^m,
+    so the harmonics follow from repeated complex multiplication by cos(phi) + i sin(phi) = (x + iy) / rho.
+
+    Parameters
+    ----------
+    cos_phi, sin_phi: np.ndarray
+        cosine and sine of the azimuthal angle
+    m_max: int
+        highest harmonic, nonnegative integer
+
+    Returns
+    -------
+    cos_m, sin_m: list
+        the m-th elements are cos(m * phi) and sin(m * phi)
+    """
+    cos_m = [np.ones_like(cos_phi), cos_phi]
+    sin_m = [np.zeros_like(sin_phi), sin_phi]
+    for m in range(2, m_max + 1):
+        cos_m.append(cos_m[m - 1] * cos_phi - sin_m[m - 1] * sin_phi)
+        sin_m.append(sin_m[m - 1] * cos_phi + cos_m[m - 1] * sin_phi)
+    return cos_m[:m_max + 1], sin_m[:m_max + 1]
+
+
+def _radial_coefficients(n: int, m: int) -> tp.List[float]:
+    """ Coefficients of the radial polynomial R_n^m
+
+    Parameters
+    ----------
+    n: int
+        index n in the definition on wikipedia, positive integer
+    m: int
+        index m in the definition on wikipedia, nonnegative integer
+
+    Returns
+    -------
+    coeffs: list
+        the k-th element is the coefficient of rho^(n-2k)
+    """
+    # m and n have the same parity, the binomial coefficients are exact integers
+    return [float((1 if k & 1 == 0 else -1) * math.comb(n - k, k) * math.comb(n - 2 * k, (n - m) // 2 - k))
+            for k in range((n - m) // 2 + 1)]
+
+
+def _reflect_quadrant(l: int, out: np.ndarray):
+    """fill the full image of a Zernike polynomial from its values on the quadrant x >= 0, y >= 0
+
+    The radial part is invariant under reflections, while the angular part picks up a sign:
+    x -> -x maps phi to pi - phi, cos(m(pi - phi)) = (-1)^m cos(m phi) and sin(m(pi - phi)) = -(-1)^m sin(m phi);
+    y -> -y maps phi to -phi, cos is even and sin is odd.
+
+    Parameters
+    ----------
+    l: int
+        index l of the polynomial
+    out: np.ndarray
+        (size, size) array whose part out[size//2:, size//2:] holds the Zernike polynomial on the mesh created by
+        create_mesh(size, radius, quadrant=True), the rest of the image is written in place
+
+    Returns
+    -------
+
+    """
+    parity = -1 if abs(l) % 2 else 1
+    sign_x = parity if l >= 0 else -parity
+    sign_y = 1 if l >= 0 else -1
+    s0 = out.shape[0] // 2
+    np.multiply(out[s0:, ::-1][:, :s0], sign_x, out=out[s0:, :s0])
+    np.multiply(out[::-1][:s0], sign_y, out=out[:s0])
+
+
+def create_mesh(size: int, radius: float, quadrant: bool = False, dtype: np.dtype = np.float64):
     """create polar-coordinate mesh on which the polynomial is defined
 
     Parameters
@@ -135,18 +374,72 @@ def create_mesh(size: int, radius: float):
         number of pixels of the length of the image
     radius: float
         radius of the disk on which the polynomial is defined
+    quadrant: bool
+        default: False
+        only create the part of the mesh where x >= 0 and y >= 0
+    dtype: np.dtype
+        default: np.float64
+        floating point type of the mesh
+
+    Returns
+    -------
+    rho, phi: np.ndarray
+        radial distance and azimuthal angle. The meshes are cached and shared between calls, hence read-only:
+        copy them before modifying them in place. The last few meshes stay in memory until clear_mesh_cache is
+        called.
+    """
+    return _create_mesh(int(size), float(radius), bool(quadrant), np.dtype(dtype))
+
+
+def clear_mesh_cache():
+    """release the meshes cached by create_mesh and zernike_polynomials
 
     Returns
     -------
 
     """
-    x = np.linspace(-radius, radius, size)
-    y = np.linspace(-radius, radius, size)
-    xx, yy = np.meshgrid(x, y, indexing='xy')
-    rho = np.sqrt(xx ** 2 + yy ** 2)
-    phi = np.angle(xx + 1j * yy)
+    _create_mesh.cache_clear()
+    _create_direction_mesh.cache_clear()
+
+
+def _cartesian_mesh(size: int, radius: float, quadrant: bool, dtype: np.dtype):
+    """Cartesian coordinates of the mesh, see create_mesh"""
+    x = np.linspace(-radius, radius, size, dtype=dtype)
+    y = np.linspace(-radius, radius, size, dtype=dtype)
+    if quadrant:
+        x = x[size // 2:]
+        y = y[size // 2:]
+    return np.meshgrid(x, y, indexing='xy')
+
+
+@lru_cache(maxsize=8)
+def _create_mesh(size: int, radius: float, quadrant: bool, dtype: np.dtype):
+    """cached implementation of create_mesh, see create_mesh"""
+    xx, yy = _cartesian_mesh(size, radius, quadrant, dtype)
+    rho = np.hypot(xx, yy)
+    phi = np.arctan2(yy, xx)
+    rho.flags.writeable = False
+    phi.flags.writeable = False
     return rho, phi
 
+
+@lru_cache(maxsize=8)
+def _create_direction_mesh(size: int, radius: float, quadrant: bool, dtype: np.dtype):
+    """cached mesh of rho, cos(phi) and sin(phi), the arguments are the same as in create_mesh
+
+    cos(phi) and sin(phi) are computed as x / rho and y / rho (1 and 0 at the origin, where phi = 0)
+    """
+    xx, yy = _cartesian_mesh(size, radius, quadrant, dtype)
+    rho = np.hypot(xx, yy)
+    # unit vector (x, y) / rho, set to (1, 0) at the origin
+    at_origin = rho == 0
+    cos_phi = np.divide(xx, rho, out=np.ones_like(rho), where=~at_origin)
+    sin_phi = np.divide(yy, rho, out=np.zeros_like(rho), where=~at_origin)
+    for array in (rho, cos_phi, sin_phi):
+        array.flags.writeable = False
+    return rho, cos_phi, sin_phi
+
+
 def _validate_individual_mode(mode: ModeType) -> int:
     """Validate the variable 'mode'
     - Check the type of the variable
@@ -160,10 +453,11 @@ def _validate_individual_mode(mode: ModeType) -> int:
     -------
 
     """
-    if type(mode) is int:
+    if isinstance(mode, _INT_TYPES) and not isinstance(mode, bool):
         if mode < 0:
             raise ValueError('please provide a nonnegative integer!')
-    elif type(mode) is str:
+        mode = int(mode)
+    elif isinstance(mode, str):
         mode_str = mode
         mode = lookup_table.get(mode.lower())
         if mode is None:
@@ -176,7 +470,8 @@ def _validate_individual_mode(mode: ModeType) -> int:
 def _validate_inputs(
         mode: ModeType,
         select: tp.Union[int, str, tp.List[ModeType], None],
-        size: int) -> tp.List[int]:
+        size: int,
+        dtype: tp.Optional[np.dtype] = None) -> tp.List[int]:
     """Validate all the input variables
 
     Parameters
@@ -184,15 +479,20 @@ def _validate_inputs(
     mode: ModeType
     select: int, str, list
     size: int
+    dtype: np.dtype, None
 
     Returns
     -------
 
     """
     # check size
-    if type(size) is not int or size < 0:
+    if not isinstance(size, _INT_TYPES) or isinstance(size, bool) or size < 0:
         raise TypeError(f'size should be a nonnegative integer, not {size} of {type(size)}')
 
+    # check dtype
+    if dtype is not None and not np.issubdtype(dtype, np.floating):
+        raise TypeError(f'dtype should be a floating point type, not {dtype}')
+
     # check mode
     mode = _validate_individual_mode(mode)
 
@@ -200,10 +500,10 @@ def _validate_inputs(
     mode_list = []
     if select is None:
         mode_list.append(mode)
-    elif type(select) is str:
+    elif isinstance(select, str):
         if select.lower() == 'all':
             mode_list = list(range(mode + 1))
-    elif type(select) is list:
+    elif isinstance(select, list):
         if len(select) == 1:
             item = _validate_individual_mode(select[0])
             if item != mode: